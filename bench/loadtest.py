@@ -0,0 +1,163 @@
+# loadtest.py
+"""
+Drive the two FastAPI services at increasing concurrency and report latency
+percentiles, throughput and upstream call counts (read from upstream_stub.py).
+
+Typical run, each in its own shell:
+
+    python bench/upstream_stub.py --bays 5000 --latency-ms 80
+    cd parking-backend && MELB_API_URL=$STUB uvicorn main:app --port 8000
+    cd web_data        && MELB_API_URL=$STUB uvicorn main:app --port 8001
+    python bench/loadtest.py --concurrency 1,4,16,64 --requests 200 --out bench_results.json
+
+($STUB = http://127.0.0.1:8900/api/explore/v2.1/catalog/datasets/on-street-parking-bay-sensors/records)
+
+Results are appended as one JSON object per run so they can be diffed over time.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+def percentile(sorted_vals: list, q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+def scenarios(proxy: str, forecast: str, kerbside_id: str) -> dict:
+    # a small CBD viewport, in each service's own bbox order
+    s, w, n, e = -37.8150, 144.9600, -37.8050, 144.9700
+    return {
+        "proxy /api/bays": f"{proxy}/api/bays",
+        "proxy /api/bays bbox": f"{proxy}/api/bays?bbox={s},{w},{n},{e}",
+        "forecast /bays/live": f"{forecast}/bays/live",
+        "forecast /bays/live bbox": f"{forecast}/bays/live?bbox={w},{s},{e},{n}",
+        "forecast /bays/with_forecast": f"{forecast}/bays/with_forecast?kerbside_id={kerbside_id}",
+        "forecast /bays/forecasts/all": f"{forecast}/bays/forecasts/all",
+    }
+
+def stub_call(stub: str, path: str, method: str = "GET") -> dict:
+    if not stub:
+        return {}
+    try:
+        r = requests.request(method, f"{stub}{path}", timeout=5)
+        return r.json()
+    except requests.RequestException:
+        return {}
+
+def run_level(url: str, concurrency: int, total: int, timeout: float) -> dict:
+    local = threading.local()
+    lat_ms = []
+    errors = 0
+    nbytes = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors, nbytes
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = requests.Session()
+            s.headers["Accept-Encoding"] = "gzip, br"
+        t0 = time.perf_counter()
+        try:
+            r = s.get(url, timeout=timeout)
+            ok = r.status_code < 400
+            size = len(r.content)
+        except requests.RequestException:
+            ok, size = False, 0
+        dt = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            lat_ms.append(dt)
+            nbytes += size
+            if not ok:
+                errors += 1
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(total)))
+    wall = time.perf_counter() - t_start
+
+    lat_ms.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "rps": round(total / wall, 1) if wall > 0 else None,
+        "p50_ms": round(percentile(lat_ms, 0.50), 2),
+        "p95_ms": round(percentile(lat_ms, 0.95), 2),
+        "p99_ms": round(percentile(lat_ms, 0.99), 2),
+        "mean_ms": round(statistics.fmean(lat_ms), 2) if lat_ms else None,
+        "bytes_per_req": int(nbytes / total) if total else 0,
+    }
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return ""
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--proxy", default="http://127.0.0.1:8000", help="parking-backend base URL")
+    ap.add_argument("--forecast", default="http://127.0.0.1:8001", help="web_data base URL")
+    ap.add_argument("--stub", default="http://127.0.0.1:8900", help="upstream_stub base URL ('' to skip)")
+    ap.add_argument("--concurrency", default="1,4,16,64", help="comma-separated levels")
+    ap.add_argument("--requests", type=int, default=200, help="requests per level")
+    ap.add_argument("--kerbside-id", default=None, help="bay for /bays/with_forecast (default: first in index)")
+    ap.add_argument("--only", default="", help="substring filter on scenario names")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--out", default="", help="append results as a JSON line to this file")
+    args = ap.parse_args()
+
+    kerb = args.kerbside_id
+    if kerb is None:
+        try:
+            idx = requests.get(f"{args.forecast}/bays/forecasts/all", timeout=args.timeout).json()
+            kerb = next(iter(idx))
+        except Exception:
+            kerb = "0"
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    run = {
+        "startedAt": datetime.now(timezone.utc).isoformat(),
+        "git": git_rev(),
+        "requestsPerLevel": args.requests,
+        "results": [],
+    }
+
+    print(f"{'scenario':32} {'conc':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'up_calls':>9} {'up_rows':>8}")
+    for name, url in scenarios(args.proxy, args.forecast, kerb).items():
+        if args.only and args.only not in name:
+            continue
+        for c in levels:
+            stub_call(args.stub, "/_reset", "POST")
+            res = run_level(url, c, args.requests, args.timeout)
+            up = stub_call(args.stub, "/_stats")
+            res.update({
+                "scenario": name,
+                "upstream_calls": up.get("calls"),
+                "upstream_rows": up.get("rows"),
+                "upstream_bytes": up.get("bytes"),
+            })
+            run["results"].append(res)
+            print(f"{name:32} {c:>5} {res['rps']:>8} {res['p50_ms']:>8} {res['p95_ms']:>8} "
+                  f"{res['p99_ms']:>8} {res['errors']:>5} {str(up.get('calls', '-')):>9} {str(up.get('rows', '-')):>8}",
+                  flush=True)
+
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"appended results to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# pipeline_bench.py
+"""
+Benchmark the offline forecast pipeline and the forecast lookups on synthetic
+data at multiples of today's volume.
+
+For each scale (default 1x, 10x, 100x of the bays/sensor CSVs in
+web_data/data/) it generates synthetic inputs in a scratch directory, then runs
+each web_data script unmodified, in order, in its own subprocess:
+
+    build_bays_zones -> backfill_zone_numbers_knn (KNN) -> create_synthetic_zones (DBSCAN)
+    -> build_bay_availability_model -> export_forecast
+
+and finally times get_prob_bay / get_prob_zone on the resulting models.
+Wall time and peak RSS are recorded per stage; a stage that fails or exceeds
+--timeout is recorded as such and the remaining stages of that scale are skipped.
+
+    python bench/pipeline_bench.py --scales 1,10 --out bench_pipeline.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEB_DATA = os.path.join(ROOT, "web_data")
+
+# today's volume, used when web_data/data/ is missing
+BASE_BAY_ROWS = 23864
+BASE_KERBSIDE_FRACTION = 0.224
+BASE_SENSOR_ROWS = 3309
+
+STAGES = [
+    ("build_bays_zones", "build_bays_zones.py"),
+    ("backfill_knn", "backfill_zone_numbers_knn.py"),
+    ("synthetic_zones_dbscan", "create_synthetic_zones.py"),
+    ("build_availability_model", "build_bay_availability_model.py"),
+    ("export_forecast", "export_forecast.py"),
+]
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def base_volume():
+    import pandas as pd
+    try:
+        bays = pd.read_csv(os.path.join(WEB_DATA, "data", "on-street-parking-bays.csv"), usecols=["KerbsideID"])
+        sensors = pd.read_csv(os.path.join(WEB_DATA, "data", "on-street-parking-bay-sensors.csv"), usecols=["KerbsideID"])
+        return len(bays), float(bays["KerbsideID"].notna().mean()), len(sensors)
+    except (FileNotFoundError, ValueError):
+        return BASE_BAY_ROWS, BASE_KERBSIDE_FRACTION, BASE_SENSOR_ROWS
+
+def generate(workdir: str, scale: int, seed: int = 7) -> dict:
+    """Write data/on-street-parking-bays.csv and data/on-street-parking-bay-sensors.csv."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    bay_rows, kerb_frac, sensor_rows = base_volume()
+    n_bays = bay_rows * scale
+    n_sensor = sensor_rows * scale
+
+    # bays cluster along road segments of ~10 bays each
+    n_segments = max(1, n_bays // 10)
+    seg_lat = rng.uniform(-37.8450, -37.7750, n_segments)
+    seg_lon = rng.uniform(144.9250, 145.0000, n_segments)
+    seg = rng.integers(0, n_segments, n_bays)
+    lat = seg_lat[seg] + rng.normal(0, 0.0002, n_bays)
+    lon = seg_lon[seg] + rng.normal(0, 0.0002, n_bays)
+    has_kerb = rng.random(n_bays) < kerb_frac
+    kerb = np.arange(n_bays) + 1000
+    bays = pd.DataFrame({
+        "RoadSegmentID": seg + 20000,
+        "KerbsideID": kerb.astype(str),
+        "RoadSegmentDescription": [f"Synthetic segment {s}" for s in seg],
+        "Latitude": lat,
+        "Longitude": lon,
+        "LastUpdated": "2023-10-31",
+    })
+    bays.loc[~has_kerb, "KerbsideID"] = None
+    # like the real feed, a few IDs carry a suffix ("7570N"), so the column reads back as strings
+    odd = has_kerb & (rng.random(n_bays) < 0.001)
+    bays.loc[odd, "KerbsideID"] = bays.loc[odd, "KerbsideID"] + "N"
+    has_kerb &= ~odd
+    bays["Location"] = bays["Latitude"].astype(str) + ", " + bays["Longitude"].astype(str)
+
+    # sensor history: events over the last 4 weeks on kerbside bays; ~7% lack a zone
+    kerb_ids = kerb[has_kerb]
+    kerb_seg = seg[has_kerb]
+    pick = rng.integers(0, len(kerb_ids), n_sensor)
+    end = datetime(2025, 1, 22, tzinfo=timezone.utc)
+    secs = rng.integers(0, 28 * 86400, n_sensor)
+    ts = [(end - timedelta(seconds=int(s))).isoformat() for s in secs]
+    zone = pd.array(7000 + kerb_seg[pick] // 25, dtype="Int64")
+    zone[rng.random(n_sensor) < 0.07] = pd.NA
+    sensors = pd.DataFrame({
+        "Lastupdated": end.isoformat(),
+        "Status_Timestamp": ts,
+        "Zone_Number": zone,
+        "Status_Description": np.where(rng.random(n_sensor) < 0.45, "Unoccupied", "Present"),
+        "KerbsideID": kerb_ids[pick],
+        "Location": [f"{lat[i]}, {lon[i]}" for i in np.flatnonzero(has_kerb)[pick]],
+    })
+
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    bays.to_csv(os.path.join(workdir, "data", "on-street-parking-bays.csv"), index=False)
+    sensors.to_csv(os.path.join(workdir, "data", "on-street-parking-bay-sensors.csv"), index=False)
+    return {"bay_rows": n_bays, "kerbside_bays": int(has_kerb.sum()), "sensor_rows": n_sensor}
+
+# --- child processes: one stage each, so timeouts and peak RSS are isolated ---
+
+def child_stage(script: str) -> dict:
+    sys.path.insert(0, WEB_DATA)
+    import pandas  # noqa: F401  (baseline RSS includes the pandas import every stage pays)
+    baseline = _peak_rss_mb()
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            runpy.run_path(os.path.join(WEB_DATA, script), run_name="__main__")
+        finally:
+            sys.stdout = stdout
+    return {"seconds": round(time.perf_counter() - t0, 3),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "baseline_rss_mb": round(baseline, 1)}
+
+def child_lookup(calls: int) -> dict:
+    sys.path.insert(0, WEB_DATA)
+    import export_forecast as ef
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            bay_df, zone_df, bay2zone = ef.load_models()
+        finally:
+            sys.stdout = stdout
+    rnd = random.Random(11)
+    kerbs = bay_df["KerbsideID"].dropna().astype(int).unique().tolist()
+    zones = zone_df["Zone_Number"].dropna().astype(int).unique().tolist() if zone_df is not None else []
+
+    def timed(fn, args_list):
+        t0 = time.perf_counter()
+        for a in args_list:
+            fn(*a)
+        dt = time.perf_counter() - t0
+        return round(dt / max(1, len(args_list)) * 1e6, 1)
+
+    res = {"bay_model_rows": len(bay_df), "zone_model_rows": 0 if zone_df is None else len(zone_df)}
+    if kerbs:
+        res["get_prob_bay_us"] = timed(
+            lambda k, w, s: ef.get_prob_bay(bay_df, k, w, s),
+            [(rnd.choice(kerbs), rnd.randrange(7), rnd.randrange(48)) for _ in range(calls)],
+        )
+        # unknown kerb: both the strict and the fallback scans miss
+        res["get_prob_bay_miss_us"] = timed(
+            lambda k, w, s: ef.get_prob_bay(bay_df, k, w, s),
+            [(-1, rnd.randrange(7), rnd.randrange(48)) for _ in range(calls)],
+        )
+    if zones:
+        res["get_prob_zone_us"] = timed(
+            lambda z, w, s: ef.get_prob_zone(zone_df, z, w, s),
+            [(rnd.choice(zones), rnd.randrange(7), rnd.randrange(48)) for _ in range(calls)],
+        )
+    res["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return res
+
+def run_child(args: list, workdir: str, timeout: float) -> dict:
+    env = dict(os.environ)
+    # keep the model build on the synthetic CSV only
+    env["BAY_HISTORY_DB"] = "0"
+    cmd = [sys.executable, os.path.abspath(__file__), "--child"] + args
+    try:
+        p = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout", "seconds": timeout}
+    if p.returncode != 0:
+        return {"status": "error", "error": p.stderr.strip().splitlines()[-1:]}
+    out = json.loads(p.stdout.strip().splitlines()[-1])
+    out["status"] = "ok"
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="1,10,100", help="comma-separated multiples of today's volume")
+    ap.add_argument("--stages", default="", help="comma-separated subset of stage names (default: all)")
+    ap.add_argument("--timeout", type=float, default=900.0, help="seconds per stage")
+    ap.add_argument("--lookup-calls", type=int, default=2000)
+    ap.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    ap.add_argument("--out", default="", help="append results as a JSON line to this file")
+    ap.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        kind = args.child[0]
+        res = child_stage(args.child[1]) if kind == "stage" else child_lookup(int(args.child[1]))
+        print(json.dumps(res))
+        return
+
+    wanted = {s for s in args.stages.split(",") if s}
+    run = {"startedAt": datetime.now(timezone.utc).isoformat(), "scales": []}
+    print(f"{'scale':>5} {'stage':28} {'status':>8} {'seconds':>9} {'peak_rss_mb':>12}")
+    for scale in [int(x) for x in args.scales.split(",") if x.strip()]:
+        workdir = tempfile.mkdtemp(prefix=f"pipeline_bench_{scale}x_")
+        t0 = time.perf_counter()
+        volume = generate(workdir, scale)
+        entry = {"scale": scale, "volume": volume,
+                 "generate_seconds": round(time.perf_counter() - t0, 3), "stages": {}}
+        print(f"{scale:>4}x {'(generate)':28} {'ok':>8} {entry['generate_seconds']:>9} {'-':>12}", flush=True)
+        failed = False
+        for name, script in STAGES:
+            if wanted and name not in wanted:
+                continue
+            if failed:
+                entry["stages"][name] = {"status": "skipped"}
+                continue
+            res = run_child(["stage", script], workdir, args.timeout)
+            entry["stages"][name] = res
+            failed = res["status"] != "ok"
+            print(f"{scale:>4}x {name:28} {res['status']:>8} {res.get('seconds', '-'):>9} "
+                  f"{res.get('peak_rss_mb', '-'):>12}", flush=True)
+        # lookups only need the model CSVs, so they still run if export_forecast timed out
+        if os.path.exists(os.path.join(workdir, "bay_availability_model.csv")):
+            res = run_child(["lookup", str(args.lookup_calls)], workdir, args.timeout)
+            entry["lookup"] = res
+            print(f"{scale:>4}x {'lookup':28} {res['status']:>8} "
+                  f"bay={res.get('get_prob_bay_us')}us miss={res.get('get_prob_bay_miss_us')}us "
+                  f"zone={res.get('get_prob_zone_us')}us", flush=True)
+        run["scales"].append(entry)
+        if args.keep:
+            entry["workdir"] = workdir
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"appended results to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# upstream_stub.py
+"""
+Local stand-in for the City of Melbourne records API
+(/api/explore/v2.1/catalog/datasets/on-street-parking-bay-sensors/records).
+
+Serves deterministic synthetic bays as paged JSON, with configurable latency,
+rate-limit headers and injected errors, and counts every call so benchmarks can
+report upstream load.
+
+    python bench/upstream_stub.py --port 8900 --bays 5000 --latency-ms 80
+
+Point the services at it with
+    MELB_API_URL=http://127.0.0.1:8900/api/explore/v2.1/catalog/datasets/on-street-parking-bay-sensors/records
+
+Extra endpoints: GET /_stats (call/page/byte counters), POST /_reset.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RECORDS_PATH = "/api/explore/v2.1/catalog/datasets/on-street-parking-bay-sensors/records"
+MAX_LIMIT = 100
+
+# Melbourne CBD and surrounds
+LAT_RANGE = (-37.8300, -37.7900)
+LON_RANGE = (144.9350, 144.9900)
+STATUSES = ["Unoccupied", "Present"]
+
+def _iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def make_bays(n: int, seed: int = 42) -> list:
+    """Fixed per-bay attributes; timestamps are derived per request from `age_s`."""
+    rnd = random.Random(seed)
+    bays = []
+    for i in range(n):
+        bays.append({
+            "kerbsideid": 10000 + i,
+            "zone_number": 7000 + i // 25 if rnd.random() > 0.2 else None,
+            "status_description": rnd.choice(STATUSES),
+            "lat": rnd.uniform(*LAT_RANGE),
+            "lon": rnd.uniform(*LON_RANGE),
+            "age_s": rnd.uniform(0, 3600),        # lastupdated = now - age_s
+            "status_age_s": rnd.uniform(0, 86400),  # status_timestamp = now - status_age_s
+        })
+    return bays
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.rows = 0
+            self.bytes = 0
+            self.errors = 0
+            self.throttled = 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "rows": self.rows,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "throttled": self.throttled,
+            }
+
+class RateLimiter:
+    """Fixed-window limiter producing X-RateLimit-* headers like the real API."""
+    def __init__(self, limit: int, window_s: int):
+        self.limit = limit
+        self.window_s = window_s
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.used = 0
+
+    def take(self):
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= self.window_s:
+                self.window_start = now
+                self.used = 0
+            self.used += 1
+            remaining = max(0, self.limit - self.used)
+            reset = int(self.window_start + self.window_s)
+            return self.used <= self.limit, remaining, reset
+
+# --- tiny ODSQL subset: enough for the queries our services send ---
+_WHERE_ZONE = re.compile(r"zone_number\s*=\s*'([^']*)'")
+_WHERE_SINCE = re.compile(r'lastupdated\s*>\s*"([^"]+)"')
+_WHERE_STATUS = re.compile(r"status_description\s*=\s*'([^']*)'")
+_NUM = r"\s*(-?[\d.]+)\s*"
+_WHERE_BBOX = re.compile(r"in_bbox\(\s*location\s*," + ",".join([_NUM] * 4) + r"\)")
+
+def parse_where(where: str, now: datetime):
+    preds = []
+    if not where:
+        return preds
+    m = _WHERE_ZONE.search(where)
+    if m:
+        z = m.group(1)
+        preds.append(lambda b: str(b["zone_number"]) == z)
+    m = _WHERE_SINCE.search(where)
+    if m:
+        since = datetime.fromisoformat(m.group(1).replace("Z", "+00:00"))
+        max_age = (now - since).total_seconds()
+        preds.append(lambda b: b["age_s"] < max_age)
+    m = _WHERE_STATUS.search(where)
+    if m:
+        st = m.group(1)
+        preds.append(lambda b: b["status_description"] == st)
+    m = _WHERE_BBOX.search(where)
+    if m:
+        lat1, lon1, lat2, lon2 = (float(x) for x in m.groups())
+        lo_lat, hi_lat = sorted((lat1, lat2))
+        lo_lon, hi_lon = sorted((lon1, lon2))
+        preds.append(lambda b: lo_lat <= b["lat"] <= hi_lat and lo_lon <= b["lon"] <= hi_lon)
+    return preds
+
+def render(b: dict, now: datetime) -> dict:
+    return {
+        "kerbsideid": b["kerbsideid"],
+        "zone_number": b["zone_number"],
+        "status_description": b["status_description"],
+        "lastupdated": _iso(now - timedelta(seconds=b["age_s"])),
+        "status_timestamp": _iso(now - timedelta(seconds=b["status_age_s"])),
+        "location": {"lat": b["lat"], "lon": b["lon"]},
+    }
+
+def make_handler(cfg, bays, stats: Stats, limiter: RateLimiter):
+    rnd = random.Random(cfg.seed + 1)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            if cfg.verbose:
+                super().log_message(fmt, *args)
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, str(v))
+            self.end_headers()
+            self.wfile.write(data)
+            return len(data)
+
+        def do_POST(self):
+            if self.path == "/_reset":
+                stats.reset()
+                return self._send(200, {"ok": True})
+            return self._send(404, {"error": "not found"})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/_stats":
+                return self._send(200, stats.snapshot())
+            if url.path != RECORDS_PATH:
+                return self._send(404, {"error": "not found"})
+
+            if cfg.latency_ms or cfg.jitter_ms:
+                time.sleep((cfg.latency_ms + rnd.uniform(0, cfg.jitter_ms)) / 1000.0)
+
+            ok, remaining, reset = limiter.take()
+            rate_headers = {
+                "X-RateLimit-Limit": limiter.limit,
+                "X-RateLimit-Remaining": remaining,
+                "X-RateLimit-Reset": reset,
+            }
+            with stats.lock:
+                stats.calls += 1
+            if not ok:
+                with stats.lock:
+                    stats.throttled += 1
+                return self._send(429, {"error_code": "TooManyRequests"}, rate_headers)
+            if cfg.error_rate and rnd.random() < cfg.error_rate:
+                with stats.lock:
+                    stats.errors += 1
+                return self._send(500, {"error_code": "InternalError"}, rate_headers)
+
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                limit = int(q.get("limit", 10))
+                offset = int(q.get("offset", 0))
+            except ValueError:
+                return self._send(400, {"error_code": "ODSQLError"}, rate_headers)
+            if limit > MAX_LIMIT or limit < 0:
+                return self._send(400, {"error_code": "InvalidRESTParameterError",
+                                        "message": f"limit must be <= {MAX_LIMIT}"}, rate_headers)
+
+            now = datetime.now(timezone.utc)
+            preds = parse_where(q.get("where", ""), now)
+            matched = [b for b in bays if all(p(b) for p in preds)]
+            if q.get("order_by", "").startswith("lastupdated"):
+                matched.sort(key=lambda b: -b["age_s"])
+            page = [render(b, now) for b in matched[offset:offset + limit]]
+            select = [f.strip() for f in q.get("select", "").split(",") if f.strip()]
+            if select:
+                page = [{f: r.get(f) for f in select} for r in page]
+
+            n = self._send(200, {"total_count": len(matched), "results": page}, rate_headers)
+            with stats.lock:
+                stats.rows += len(page)
+                stats.bytes += n
+
+    return Handler
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--bays", type=int, default=5000, help="number of synthetic bays")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="fixed per-request latency")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    ap.add_argument("--rate-limit", type=int, default=1000000, help="requests per window before 429s")
+    ap.add_argument("--rate-window", type=int, default=3600, help="rate-limit window in seconds")
+    ap.add_argument("--verbose", action="store_true")
+    cfg = ap.parse_args()
+
+    bays = make_bays(cfg.bays, cfg.seed)
+    stats = Stats()
+    limiter = RateLimiter(cfg.rate_limit, cfg.rate_window)
+    server = ThreadingHTTPServer((cfg.host, cfg.port), make_handler(cfg, bays, stats, limiter))
+    print(f"upstream stub: {len(bays):,} bays on http://{cfg.host}:{cfg.port}{RECORDS_PATH}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
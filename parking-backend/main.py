@@ -1,49 +1,187 @@
-from fastapi import FastAPI, Query, Response
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from typing import Optional, Tuple, List
 import requests
 from datetime import datetime, timedelta, timezone
 import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared parking_common package
+
+# Multi-worker mode: with SHARED_SNAPSHOT_PATH set (e.g. /dev/shm/parking-snapshot),
+# one elected worker crawls upstream every SHARED_REFRESH_SECONDS and publishes the
+# normalized city-wide snapshot there; all workers answer covered requests from it.
+SHARED_SNAPSHOT_PATH = os.getenv("SHARED_SNAPSHOT_PATH", "").strip()
+SHARED_REFRESH_SECONDS = float(os.getenv("SHARED_REFRESH_SECONDS", "5"))
+if SHARED_SNAPSHOT_PATH:
+    # sum /metrics across this run's workers (<path>.metrics.<supervisor pid>);
+    # must happen before prometheus_client is imported
+    from parking_common.multiproc import use_per_run_dir
+    use_per_run_dir(SHARED_SNAPSHOT_PATH + ".metrics")
+
+from parking_common.history_store import open_history
+from parking_common.responses import ORJSONResponse
+from parking_common.status import canonical_status
+from shared_snapshot import SharedSnapshot
+from parking_common.metrics import cache_result, install as install_metrics, observe_upstream_page, stage
 
 DATASET_SLUG = "on-street-parking-bay-sensors"
-BASE = f"https://data.melbourne.vic.gov.au/api/explore/v2.1/catalog/datasets/{DATASET_SLUG}/records"
+BASE = os.getenv(
+    "MELB_API_URL",
+    f"https://data.melbourne.vic.gov.au/api/explore/v2.1/catalog/datasets/{DATASET_SLUG}/records",
+)
 SELECT = "kerbsideid,status_description,lastupdated,location"
 PAGE_LIMIT = 100
 FETCH_CAP = 20000
 
 APP_KEY = os.getenv("MELB_API_KEY", "").strip()
 
+# Every upstream crawl is appended (state changes only) to the history store that
+# web_data/build_bay_availability_model.py trains from. BAY_HISTORY_DB sets its path
+# (default web_data/data/bay_history.sqlite, shared with web_data); BAY_HISTORY_DB=0 disables.
+HISTORY = open_history()
+if HISTORY is not None:
+    SELECT += ",status_timestamp,zone_number"
+
+SHARED = SharedSnapshot(SHARED_SNAPSHOT_PATH) if SHARED_SNAPSHOT_PATH else None
+
 SESSION = requests.Session()
 if APP_KEY:
     SESSION.headers.update({"Authorization": f"Apikey {APP_KEY}"})
 
-app = FastAPI(title="Melbourne Parking Proxy", version="1.2.2")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SHARED is not None:
+        SHARED.start(refresh_shared_snapshot, SHARED_REFRESH_SECONDS)
+    yield
+    if SHARED is not None:
+        SHARED.stop()
+
+app = FastAPI(title="Melbourne Parking Proxy", version="1.2.2",
+              default_response_class=ORJSONResponse, lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(GZipMiddleware, minimum_size=500)
+# level 6 is within ~2% of the default 9 on this JSON at well under half the CPU
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+install_metrics(app)
 
 def _iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
-def build_params(since_iso: Optional[str]) -> dict:
-    if since_iso:
-        try:
-            since = datetime.fromisoformat(since_iso.replace("Z", "+00:00"))
-        except Exception:
-            since = datetime.now(timezone.utc) - timedelta(minutes=30)
-    else:
+def _parse_ts(ts: Optional[str]) -> Optional[datetime]:
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except Exception:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def since_floor(since_iso: Optional[str]) -> datetime:
+    since = _parse_ts(since_iso) if since_iso else None
+    if since is None:
         since = datetime.now(timezone.utc) - timedelta(minutes=30)
-    buffered = since - timedelta(minutes=10)
-    where = f'location IS NOT NULL AND lastupdated > "{_iso(buffered)}"'
-    return {"select": SELECT, "where": where, "order_by": "lastupdated ASC"}
+    return since - timedelta(minutes=10)
+
+def params_after(floor: datetime,
+                 bbox: Optional[Tuple[float, float, float, float]] = None,
+                 status: Optional[str] = None) -> dict:
+    clauses = ["location IS NOT NULL", f'lastupdated > "{_iso(floor)}"']
+    # push viewport/status filters upstream so pages scale with the query, not the city
+    if bbox:
+        s, w, n, e = bbox
+        clauses.append(f"in_bbox(location, {s}, {w}, {n}, {e})")
+    status = canonical_status(status)
+    if status:
+        clauses.append("status_description = '" + status.replace("'", "''") + "'")
+    return {"select": SELECT, "where": " AND ".join(clauses), "order_by": "lastupdated ASC"}
+
+# Last unfiltered (city-wide) crawl. A request whose since-window it covers is
+# answered by filtering it locally instead of crawling again. In multi-worker
+# mode it is the fallback for when the shared snapshot is missing or stale.
+SNAPSHOT_TTL_SECONDS = 5
+_snapshot: Optional[dict] = None
+
+def _usable(snap: Optional[dict], ttl: float, floor: datetime) -> bool:
+    if snap is None or time.time() - snap["fetched_at"] >= ttl:
+        return False
+    return not snap["truncated"] and snap["floor"] <= floor
+
+def covering_snapshot(floor: datetime) -> Tuple[Optional[dict], str]:
+    """(snapshot, source) for the freshest snapshot covering `floor`, else (None, "upstream")."""
+    if SHARED is not None:
+        shared = SHARED.read()
+        # the leader refreshes on a timer; tolerate a couple of missed ticks
+        if _usable(shared, SHARED_REFRESH_SECONDS * 3, floor):
+            return shared, "shared"
+    if _usable(_snapshot, SNAPSHOT_TTL_SECONDS, floor):
+        return _snapshot, "snapshot"
+    return None, "upstream"
+
+# Leader-only state: the crawl is incremental, merging changed bays by id into the
+# previous snapshot rather than re-reading the whole window every tick.
+_leader = {"by_id": {}, "last_seen": None, "complete": False}
+LEADER_OVERLAP = timedelta(seconds=60)
+
+def refresh_shared_snapshot() -> dict:
+    floor = since_floor(None)
+    if _leader["complete"] and _leader["last_seen"] is not None:
+        after = max(floor, _leader["last_seen"] - LEADER_OVERLAP)
+        by_id = _leader["by_id"]
+    else:
+        after, by_id = floor, {}
+    with stage("upstream_fetch"):
+        raw, _, rate = fetch_all(params_after(after))
+    if HISTORY is not None:
+        HISTORY.record_best_effort(raw)
+    with stage("normalize"):
+        for r in normalize(raw):
+            key = r["id"] if r["id"] is not None else (r["lat"], r["lon"])
+            by_id[key] = r
+    last_seen = _leader["last_seen"]
+    fresh = {}
+    for key, r in by_id.items():
+        ts = _parse_ts(r.get("lastupdated"))
+        if ts is None or ts <= floor:
+            continue
+        fresh[key] = r
+        if last_seen is None or ts > last_seen:
+            last_seen = ts
+    truncated = len(raw) >= FETCH_CAP
+    _leader.update({"by_id": fresh, "last_seen": last_seen, "complete": not truncated})
+    return {
+        "floor": floor,
+        "fetched_at": time.time(),
+        "truncated": truncated,
+        "records": list(fresh.values()),
+        "rate": rate,
+    }
+
+def filter_snapshot(snap: dict, floor: datetime, status: Optional[str],
+                    bbox: Optional[Tuple[float, float, float, float]]) -> list:
+    if "view" in snap:
+        # shared snapshot: filter the mapped columns, decoding only the rows kept
+        return snap["view"].select(floor.timestamp(), status and status.lower(), bbox)
+    return filter_bbox(filter_records(snap["records"], floor, status), bbox)
+
+def filter_records(records: list, floor: datetime, status: Optional[str]) -> list:
+    out = []
+    for r in records:
+        ts = _parse_ts(r.get("lastupdated"))
+        if ts is None or ts <= floor:
+            continue
+        if status and r["status"] != status.lower():
+            continue
+        out.append(r)
+    return out
 
 def fetch_all(params: dict) -> tuple[list, List[str], dict]:
     offset = 0
@@ -67,6 +205,7 @@ def fetch_all(params: dict) -> tuple[list, List[str], dict]:
         }
         data = r.json()
         rows = data.get("results", [])
+        observe_upstream_page(r.headers, len(rows))
         all_rows.extend(rows)
         if len(rows) < PAGE_LIMIT or len(all_rows) >= FETCH_CAP:
             break
@@ -121,11 +260,9 @@ def bays(
     debug: Optional[int] = Query(default=0),
     max_points: Optional[int] = Query(default=3000, ge=100),
     cell: Optional[float] = Query(default=0.0008, gt=0),
-    response: Response = None,
+    status: Optional[str] = Query(default=None),
 ):
-    params = build_params(since)
-    raw, urls, rate = fetch_all(params)
-    recs_all = normalize(raw)
+    global _snapshot
     bbox_tuple = None
     if bbox:
         try:
@@ -133,20 +270,50 @@ def bays(
             bbox_tuple = (s, w, n, e)
         except Exception:
             bbox_tuple = None
-    recs_bbox = filter_bbox(recs_all, bbox_tuple)
+    status = (status or "").strip() or None
+
+    floor = since_floor(since)
+    snap, served_from = covering_snapshot(floor)
+    cache_result("snapshot", snap is not None)
+    if snap is not None:
+        urls, rate = [], snap["rate"]
+        with stage("snapshot_filter"):
+            recs_all = filter_snapshot(snap, floor, status, bbox_tuple)
+    else:
+        # the same floor the snapshot below records, so it never claims unfetched time
+        params = params_after(floor, bbox_tuple, status)
+        with stage("upstream_fetch"):
+            raw, urls, rate = fetch_all(params)
+        if HISTORY is not None:
+            HISTORY.record_best_effort(raw)
+        with stage("normalize"):
+            recs_all = normalize(raw)
+        if bbox_tuple is None and status is None:
+            _snapshot = {
+                "floor": floor,
+                "fetched_at": time.time(),
+                "truncated": len(raw) >= FETCH_CAP,
+                "records": recs_all,
+                "rate": rate,
+            }
+    with stage("filter_bbox"):
+        recs_bbox = filter_bbox(recs_all, bbox_tuple)
     next_since = since
     for r in recs_bbox:
         ts = r.get("lastupdated")
         if ts and (next_since is None or ts > next_since):
             next_since = ts
-    recs = thin_grid(recs_bbox, cell=cell, max_points=max_points)
+    with stage("thin_grid"):
+        recs = thin_grid(recs_bbox, cell=cell, max_points=max_points)
     resp = {"next_since": next_since, "count": len(recs), "records": recs}
     if debug:
         resp["upstream_urls"] = urls
+        resp["served_from"] = served_from
         resp["has_key"] = bool(APP_KEY)
         resp["upstream_rate"] = rate
         resp["thin_cell"] = cell
         resp["thin_limit"] = max_points
-    if response is not None:
-        response.headers["Cache-Control"] = "public, max-age=5"
-    return resp
+    with stage("serialize"):
+        out = ORJSONResponse(resp)
+    out.headers["Cache-Control"] = "public, max-age=5"
+    return out
@@ -0,0 +1,240 @@
+# shared_snapshot.py
+"""
+One upstream crawler shared by every worker process.
+
+With several uvicorn/gunicorn workers, each would otherwise crawl the open data
+API itself. Instead, every worker runs a SharedSnapshot: the one holding an
+exclusive flock on `<path>.lock` becomes the leader. It calls `refresh()` every
+`interval` seconds and publishes the result to `<path>`. The rest only read.
+If the leader dies its lock is released and another worker takes over.
+
+File layout (little-endian, columns 8-byte aligned):
+
+    header   magic, generation, fetched_at, floor_ts, count, meta_len, truncated
+    meta     orjson {"rate": {...}, "statuses": [...]}, padded to 8 bytes
+    columns  lastupdated epoch (f64), lat (f64), lon (f64), kerbsideid (i64),
+             lastupdated ISO (32 bytes), status (u8 index into meta.statuses)
+
+Each publish writes a temp file and os.replace()s it, so readers never see a
+torn write. Readers mmap a new generation once and cast memoryviews over the
+columns. `SnapshotView.select()` filters on since/status/bbox straight from the
+mapping and builds dicts only for the rows it returns; nothing is decoded per
+request beyond that. Ids that are not integers are published as None.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PKSNAP02"
+HEADER = struct.Struct("<8sQddQQ?7x")  # magic, generation, fetched_at, floor_ts, count, meta_len, truncated
+TS_WIDTH = 32  # "2024-01-01T00:00:00.000000+00:00"
+NO_ID = -(2 ** 63)
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+def _epoch(ts: Optional[str]) -> float:
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except Exception:
+        return float("nan")  # never newer than a floor, so never selected
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+def _int_id(v) -> int:
+    try:
+        return int(v) if v is not None else NO_ID
+    except (TypeError, ValueError):
+        return NO_ID
+
+class SnapshotView:
+    """Read-only columns of one published generation, backed by its mapping."""
+    def __init__(self, mm: mmap.mmap, count: int, offset: int, statuses: List[str]):
+        self.count = count
+        self.statuses = statuses
+        buf = memoryview(mm)
+        cols = []
+        for fmt, width in (("d", 8), ("d", 8), ("d", 8), ("q", 8)):
+            cols.append(buf[offset:offset + width * count].cast(fmt))
+            offset += width * count
+        self._ts, self._lat, self._lon, self._id = cols
+        self._iso = buf[offset:offset + TS_WIDTH * count]
+        offset += TS_WIDTH * count
+        self._status = buf[offset:offset + count]
+        # the mapping stays open for as long as this view (or a memoryview of it) is alive
+
+    def __len__(self) -> int:
+        return self.count
+
+    def row(self, i: int) -> dict:
+        rid = self._id[i]
+        return {
+            "id": None if rid == NO_ID else rid,
+            "status": self.statuses[self._status[i]],
+            "lastupdated": bytes(self._iso[i * TS_WIDTH:(i + 1) * TS_WIDTH]).rstrip(b"\0").decode(),
+            "lat": self._lat[i],
+            "lon": self._lon[i],
+        }
+
+    def select(self, floor_ts: float, status: Optional[str] = None,
+               bbox: Optional[Tuple[float, float, float, float]] = None) -> List[dict]:
+        """Rows updated after floor_ts, with `status` (lowercase) and inside bbox (s, w, n, e)."""
+        code = None
+        if status:
+            if status not in self.statuses:
+                return []
+            code = self.statuses.index(status)
+        ts, lat, lon, st = self._ts, self._lat, self._lon, self._status
+        out = []
+        for i in range(self.count):
+            if not ts[i] > floor_ts:
+                continue
+            if code is not None and st[i] != code:
+                continue
+            if bbox:
+                s, w, n, e = bbox
+                if not (s <= lat[i] <= n and w <= lon[i] <= e):
+                    continue
+            out.append(self.row(i))
+        return out
+
+class SharedSnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        self.is_leader = False
+        self._lock_fd: Optional[int] = None
+        self._generation = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # reader side: mapped snapshot for the file identity last seen
+        self._read_lock = threading.Lock()
+        self._file_id = None
+        self._cached: Optional[dict] = None
+
+    # --- leader side ---
+
+    def start(self, refresh: Callable[[], dict], interval: float):
+        self._thread = threading.Thread(
+            target=self._run, args=(refresh, interval), name="snapshot-leader", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the flock
+            self._lock_fd = None
+            self.is_leader = False
+
+    def _try_lead(self) -> bool:
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # continue the generation sequence of the previous leader, if any
+        current = self._read_header()
+        self._generation = current[1] if current else 0
+        return True
+
+    def _run(self, refresh: Callable[[], dict], interval: float):
+        delay = 0.0
+        while not self._stop.wait(delay):
+            delay = interval
+            if not self.is_leader:
+                self.is_leader = self._try_lead()
+                if not self.is_leader:
+                    continue
+            try:
+                self.publish(refresh())
+            except Exception:
+                # keep serving the last good snapshot; try again next tick
+                logger.exception("snapshot refresh failed")
+
+    def publish(self, snap: dict):
+        """Write `snap` (records shaped like main.normalize() output) as the next generation."""
+        records = snap["records"]
+        statuses = sorted({r["status"] for r in records})[:256]
+        codes = {s: i for i, s in enumerate(statuses)}
+        meta = orjson.dumps({"rate": snap.get("rate") or {}, "statuses": statuses})
+        self._generation += 1
+        header = HEADER.pack(
+            MAGIC, self._generation, snap["fetched_at"], snap["floor"].timestamp(),
+            len(records), len(meta), bool(snap["truncated"]),
+        )
+        iso = b"".join(
+            (r.get("lastupdated") or "").encode()[:TS_WIDTH].ljust(TS_WIDTH, b"\0") for r in records
+        )
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(meta.ljust(_pad8(len(meta)), b" "))
+            f.write(array("d", [_epoch(r.get("lastupdated")) for r in records]).tobytes())
+            f.write(array("d", [r["lat"] for r in records]).tobytes())
+            f.write(array("d", [r["lon"] for r in records]).tobytes())
+            f.write(array("q", [_int_id(r.get("id")) for r in records]).tobytes())
+            f.write(iso)
+            f.write(bytes(codes.get(r["status"], 0) for r in records))
+        os.replace(tmp, self.path)
+
+    # --- reader side ---
+
+    def _read_header(self):
+        try:
+            with open(self.path, "rb") as f:
+                head = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(head) < HEADER.size:
+            return None
+        fields = HEADER.unpack(head)
+        return fields if fields[0] == MAGIC else None
+
+    def read(self) -> Optional[dict]:
+        """Latest published snapshot shaped like main._snapshot, with a SnapshotView
+        under "view" instead of a "records" list; None if nothing is published."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        file_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if file_id == self._file_id:
+            return self._cached
+        with self._read_lock:
+            if file_id == self._file_id:
+                return self._cached
+            try:
+                with open(self.path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return self._cached
+            if len(mm) < HEADER.size:
+                return None
+            magic, generation, fetched_at, floor_ts, count, meta_len, truncated = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                return None
+            if self._cached is None or self._cached["generation"] != generation:
+                meta = orjson.loads(mm[HEADER.size:HEADER.size + meta_len])
+                offset = HEADER.size + _pad8(meta_len)
+                self._cached = {
+                    "generation": generation,
+                    "fetched_at": fetched_at,
+                    "floor": datetime.fromtimestamp(floor_ts, timezone.utc),
+                    "truncated": truncated,
+                    "view": SnapshotView(mm, count, offset, meta["statuses"]),
+                    "rate": meta["rate"],
+                }
+            self._file_id = file_id
+            return self._cached
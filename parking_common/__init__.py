@@ -0,0 +1,6 @@
+"""
+Code shared by the parking-backend proxy and the web_data forecast service.
+
+Both services put the repository root on sys.path at startup so this package
+imports without installing anything.
+"""
@@ -0,0 +1,160 @@
+# history_store.py
+"""
+Append-only history of live bay sensor state changes.
+
+Every live poll of the City of Melbourne sensor feed is handed to `record()`;
+rows are keyed by (kerbsideid, status_timestamp) so a bay only produces a new
+row when its status actually changes. Stored in SQLite (WAL mode) so several
+processes can append while `build_bay_availability_model.py` reads it.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = str(Path(__file__).resolve().parent.parent / "web_data" / "data" / "bay_history.sqlite")
+
+def history_path() -> Optional[str]:
+    """
+    BAY_HISTORY_DB, the one switch for both services and the model build: the
+    store's path, DEFAULT_PATH when unset, and "0" (or empty) to turn history off.
+    """
+    path = os.getenv("BAY_HISTORY_DB", DEFAULT_PATH).strip()
+    return None if path in ("", "0") else path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bay_events (
+    kerbsideid  INTEGER NOT NULL,
+    ts          INTEGER NOT NULL,  -- status_timestamp, unix seconds UTC
+    status      TEXT    NOT NULL,
+    zone_number INTEGER,
+    lat         REAL,
+    lon         REAL,
+    PRIMARY KEY (kerbsideid, ts)
+) WITHOUT ROWID;
+"""
+
+def _to_epoch(ts: Any) -> Optional[int]:
+    if not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def _to_int(v: Any) -> Optional[int]:
+    try:
+        return int(str(v).strip())
+    except (TypeError, ValueError):
+        return None
+
+def _lat_lon(loc: Any):
+    if isinstance(loc, dict):
+        try:
+            return float(loc.get("lat")), float(loc.get("lon"))
+        except (TypeError, ValueError):
+            return None, None
+    if isinstance(loc, str) and "," in loc:
+        try:
+            lat, lon = (float(t) for t in loc.split(",", 1))
+            return lat, lon
+        except ValueError:
+            return None, None
+    return None, None
+
+class HistoryStore:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Append raw upstream rows (kerbsideid, status_description, status_timestamp,
+        zone_number, location). Rows already seen are ignored. Returns rows inserted.
+        """
+        batch = []
+        for r in rows:
+            kerb = _to_int(r.get("kerbsideid"))
+            ts = _to_epoch(r.get("status_timestamp"))
+            if kerb is None or ts is None:
+                continue
+            lat, lon = _lat_lon(r.get("location"))
+            batch.append((
+                kerb,
+                ts,
+                (r.get("status_description") or "").strip().lower(),
+                _to_int(r.get("zone_number")),
+                lat,
+                lon,
+            ))
+        if not batch:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO bay_events VALUES (?, ?, ?, ?, ?, ?)", batch
+                )
+            return conn.total_changes - before
+
+    def record_best_effort(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """`record()` for request paths: history must never fail a live request."""
+        try:
+            return self.record(rows)
+        except Exception:
+            logger.exception("history record failed")
+            return 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def open_history() -> Optional[HistoryStore]:
+    """The store named by BAY_HISTORY_DB, or None when history is turned off."""
+    path = history_path()
+    return HistoryStore(path) if path else None
+
+def read_history(path: Optional[str] = DEFAULT_PATH):
+    """
+    Load the store in the same column layout as data/on-street-parking-bay-sensors.csv
+    (KerbsideID, Status_Description, Status_Timestamp, Zone_Number).
+    """
+    import pandas as pd  # only the offline scripts need pandas
+
+    cols = ["KerbsideID", "Status_Description", "Status_Timestamp", "Zone_Number"]
+    if not path or not os.path.exists(path):
+        return pd.DataFrame(columns=cols)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10)
+    try:
+        df = pd.read_sql_query(
+            "SELECT kerbsideid, status, ts, zone_number FROM bay_events", conn
+        )
+    finally:
+        conn.close()
+    df.columns = cols
+    df["Status_Timestamp"] = pd.to_datetime(df["Status_Timestamp"], unit="s", utc=True)
+    return df
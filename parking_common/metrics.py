@@ -0,0 +1,152 @@
+# metrics.py
+"""
+Prometheus metrics, per-stage timers and an opt-in sampling profiler.
+
+    install(app)               # request timing middleware + GET /metrics
+    with stage("normalize"):   # time a hot-path stage
+        ...
+
+The profiler endpoints (POST /debug/profile/start, POST /debug/profile/stop)
+only exist when PROFILER_ENABLED=1; `stop` returns collapsed stacks
+("frame;frame;frame count" lines) ready for flamegraph.pl / speedscope.
+
+Several workers on one port: set PROMETHEUS_MULTIPROC_DIR before this module
+(and so prometheus_client) is first imported. Each process then writes its
+values to files in that directory and /metrics sums them across workers;
+without it a scrape only sees whichever worker answered. multiproc.py picks a
+fresh directory per server run so a restart does not inherit old samples.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds",
+    "Time spent in a hot-path stage",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPSTREAM_PAGES = Counter("upstream_pages_total", "Pages fetched from the open data API")
+UPSTREAM_ROWS = Counter("upstream_rows_total", "Rows received from the open data API")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+RATE_LIMIT_REMAINING = Gauge(
+    "upstream_rate_limit_remaining", "Last X-RateLimit-Remaining seen", multiprocess_mode="mostrecent",
+)
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+def record_stage(name: str, seconds: float):
+    """For stages whose time is accumulated across a loop rather than one block."""
+    STAGE_SECONDS.labels(name).observe(seconds)
+
+def cache_result(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def observe_upstream_page(headers, rows: int):
+    UPSTREAM_PAGES.inc()
+    UPSTREAM_ROWS.inc(rows)
+    remaining = headers.get("X-RateLimit-Remaining")
+    if remaining is not None:
+        try:
+            RATE_LIMIT_REMAINING.set(float(remaining))
+        except ValueError:
+            pass
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval via sys._current_frames()."""
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return "\n".join(f"{stack} {n}" for stack, n in self.samples.most_common())
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(parts))] += 1
+
+_profiler = SamplingProfiler()
+
+def install(app: FastAPI):
+    @app.middleware("http")
+    async def _timing(request: Request, call_next):
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            if path != "/metrics":
+                REQUEST_SECONDS.labels(request.method, path, str(status)).observe(time.perf_counter() - t0)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        if MULTIPROC_DIR:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    if PROFILER_ENABLED:
+        @app.post("/debug/profile/start", include_in_schema=False)
+        def profile_start(interval_ms: float = 5.0):
+            if _profiler.running:
+                return {"running": True}
+            _profiler.interval = max(0.001, interval_ms / 1000.0)
+            _profiler.start()
+            return {"running": True, "intervalMs": _profiler.interval * 1000}
+
+        @app.post("/debug/profile/stop", include_in_schema=False)
+        def profile_stop():
+            return Response(_profiler.stop(), media_type="text/plain")
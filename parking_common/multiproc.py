@@ -0,0 +1,43 @@
+# multiproc.py
+"""
+A per-run PROMETHEUS_MULTIPROC_DIR for servers with several worker processes.
+
+In multiprocess mode prometheus_client writes each worker's samples to files
+under PROMETHEUS_MULTIPROC_DIR, and /metrics sums every file it finds there. A
+directory reused across restarts would therefore add the previous run's counts
+to the new ones. `use_per_run_dir(base)` keys the directory on the workers'
+parent (the uvicorn supervisor that all workers of one run share) and removes
+directories whose supervisor has exited.
+
+Call it before anything imports prometheus_client, which includes
+parking_common.metrics.
+"""
+import multiprocessing
+import os
+import shutil
+from glob import escape, glob
+from typing import Optional
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by someone else
+    return True
+
+def use_per_run_dir(base: str) -> Optional[str]:
+    """Point PROMETHEUS_MULTIPROC_DIR at `<base>.<supervisor pid>`; returns the directory in use."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return os.environ["PROMETHEUS_MULTIPROC_DIR"]  # set by the deployment, which owns its cleanup
+    if multiprocessing.parent_process() is None:
+        return None  # single process (no --workers): the default registry already sees everything
+    for old in glob(escape(base) + ".*"):
+        suffix = old.rsplit(".", 1)[1]
+        if suffix.isdigit() and not _alive(int(suffix)):
+            shutil.rmtree(old, ignore_errors=True)  # several workers may race to remove it
+    path = f"{base}.{os.getppid()}"
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
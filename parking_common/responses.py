@@ -0,0 +1,11 @@
+# responses.py
+"""orjson-backed JSON response used as both apps' default_response_class."""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+class ORJSONResponse(JSONResponse):
+    # defined here because FastAPI's own ORJSONResponse is deprecated
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,21 @@
+# status.py
+"""
+Bay status values as the open data API spells them.
+
+The API's `status_description` is exactly "Unoccupied" or "Present" and its
+`=` comparison is case-sensitive. Clients may pass "unoccupied", so a status
+filter is canonicalised before it is pushed into a where clause. That keeps
+the upstream result the same as a local case-insensitive filter over a
+cached snapshot.
+"""
+from typing import Optional
+
+STATUSES = ("Unoccupied", "Present")
+_CANONICAL = {s.lower(): s for s in STATUSES}
+
+def canonical_status(status: Optional[str]) -> Optional[str]:
+    """Upstream spelling of `status`; blank means no filter, unknown values pass through."""
+    status = (status or "").strip()
+    if not status:
+        return None
+    return _CANONICAL.get(status.lower(), status)
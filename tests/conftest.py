@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# same layout the services run with: repo root for parking_common, plus each app dir
+for p in (ROOT, ROOT / "web_data", ROOT / "parking-backend"):
+    sys.path.insert(0, str(p))
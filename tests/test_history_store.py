@@ -0,0 +1,26 @@
+from parking_common.history_store import DEFAULT_PATH, history_path, open_history, read_history
+
+def test_one_switch_for_both_services(monkeypatch, tmp_path):
+    monkeypatch.delenv("BAY_HISTORY_DB", raising=False)
+    assert history_path() == DEFAULT_PATH
+    for off in ("0", "", " "):
+        monkeypatch.setenv("BAY_HISTORY_DB", off)
+        assert history_path() is None
+        assert open_history() is None
+    monkeypatch.setenv("BAY_HISTORY_DB", str(tmp_path / "h.sqlite"))
+    assert open_history().path == str(tmp_path / "h.sqlite")
+
+def test_record_dedupes_and_reads_back(monkeypatch, tmp_path):
+    monkeypatch.setenv("BAY_HISTORY_DB", str(tmp_path / "h.sqlite"))
+    store = open_history()
+    row = {"kerbsideid": "10001", "status_description": "Present ",
+           "status_timestamp": "2025-01-22T10:00:00Z", "zone_number": 7001,
+           "location": {"lat": -37.81, "lon": 144.96}}
+    assert store.record([row, {"kerbsideid": None}]) == 1
+    assert store.record([row]) == 0  # same (kerbsideid, status_timestamp)
+    assert store.record_best_effort([dict(row, status_timestamp="2025-01-22T10:05:00Z")]) == 1
+    store.close()
+    df = read_history(history_path())
+    assert list(df["KerbsideID"]) == [10001, 10001]
+    assert set(df["Status_Description"]) == {"present"}
+    assert read_history(None).empty
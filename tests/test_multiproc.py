@@ -0,0 +1,63 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import ROOT
+
+# A stand-in for `uvicorn --workers N`: a supervisor spawning workers that each count requests.
+SUPERVISOR = textwrap.dedent("""
+    import json, multiprocessing, os, sys
+    sys.path.insert(0, {root!r})
+
+    def worker(base, requests):
+        from parking_common.multiproc import use_per_run_dir
+        use_per_run_dir(base)
+        from prometheus_client import Counter
+        c = Counter("served", "requests served")
+        for _ in range(requests):
+            c.inc()
+
+    if __name__ == "__main__":
+        base, workers, requests = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+        ctx = multiprocessing.get_context("spawn")
+        procs = [ctx.Process(target=worker, args=(base, requests)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        from prometheus_client import CollectorRegistry
+        from prometheus_client.multiprocess import MultiProcessCollector
+        path = f"{{base}}.{{os.getpid()}}"
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=path)
+        print(json.dumps({{"path": path, "served": registry.get_sample_value("served_total")}}))
+""")
+
+def run(script, base, workers, requests):
+    env = {k: v for k, v in os.environ.items() if k != "PROMETHEUS_MULTIPROC_DIR"}
+    out = subprocess.run([sys.executable, str(script), base, str(workers), str(requests)],
+                         env=env, capture_output=True, text=True, check=True, timeout=60)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_restart_does_not_inherit_previous_samples(tmp_path):
+    script = tmp_path / "supervisor.py"
+    script.write_text(SUPERVISOR.format(root=str(ROOT)))
+    base = str(tmp_path / "snap.metrics")
+
+    first = run(script, base, workers=3, requests=10)
+    assert first["served"] == 30.0
+    second = run(script, base, workers=2, requests=1)
+    assert second["served"] == 2.0
+    # the first run's supervisor has exited, so its directory was cleaned up
+    assert glob.glob(base + ".*") == [second["path"]]
+
+def test_single_process_leaves_env_alone(monkeypatch, tmp_path):
+    from parking_common.multiproc import use_per_run_dir
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    assert use_per_run_dir(str(tmp_path / "m")) is None
+    assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path / "mine"))
+    assert use_per_run_dir(str(tmp_path / "m")) == str(tmp_path / "mine")
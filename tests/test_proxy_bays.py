@@ -0,0 +1,42 @@
+import importlib.util
+
+import pytest
+
+from conftest import ROOT
+
+@pytest.fixture
+def proxy(monkeypatch):
+    monkeypatch.delenv("SHARED_SNAPSHOT_PATH", raising=False)
+    monkeypatch.setenv("BAY_HISTORY_DB", "0")
+    # loaded under its own name: web_data also has a main.py
+    spec = importlib.util.spec_from_file_location("proxy_main", ROOT / "parking-backend" / "main.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    sent = []
+
+    def fake_fetch_all(params):
+        sent.append(params)
+        return [], [], {}
+    monkeypatch.setattr(mod, "fetch_all", fake_fetch_all)
+    mod.sent = sent
+    return mod
+
+def call(proxy, **kw):
+    args = dict(since=None, bbox=None, debug=1, max_points=3000, cell=0.0008, status=None)
+    args.update(kw)
+    return proxy.bays(**args)
+
+def test_pushed_floor_is_the_recorded_floor(proxy):
+    call(proxy)
+    floor = proxy._snapshot["floor"]
+    assert f'lastupdated > "{proxy._iso(floor)}"' in proxy.sent[0]["where"]
+    # and the snapshot answers the next request without another crawl
+    call(proxy)
+    assert len(proxy.sent) == 1
+
+def test_filtered_request_pushes_canonical_status_and_bbox(proxy):
+    call(proxy, status="unoccupied", bbox="-37.82,144.95,-37.80,144.97")
+    where = proxy.sent[0]["where"]
+    assert "status_description = 'Unoccupied'" in where
+    assert "in_bbox(location, -37.82, 144.95, -37.8, 144.97)" in where
+    assert proxy._snapshot is None  # only unfiltered crawls are kept
@@ -0,0 +1,86 @@
+from query_planner import LiveQuery, SnapshotCache, parse_bbox
+
+CBD = (144.95, -37.82, 144.98, -37.80)      # min_lon, min_lat, max_lon, max_lat
+INSIDE = (144.96, -37.815, 144.97, -37.805)
+
+def rec(kerb, lat, lon, status="Present", zone="7001"):
+    return {"KerbsideID": kerb, "Zone_Number": zone, "Status_Description": status,
+            "Location": {"lat": lat, "lon": lon}}
+
+def test_parse_bbox():
+    assert parse_bbox("144.95,-37.82,144.98,-37.80") == CBD
+    assert parse_bbox("1,2,3") is None
+    assert parse_bbox("") is None
+
+def test_where_pushes_canonical_status():
+    q = LiveQuery(limit=10, zone_number="7001", bbox=CBD, status=" unoccupied ")
+    assert q.status == "Unoccupied"
+    assert q.where() == ("zone_number = '7001' AND status_description = 'Unoccupied' "
+                         "AND in_bbox(location, -37.82, 144.95, -37.8, 144.98)")
+    assert LiveQuery(limit=10, status="") == LiveQuery(limit=10)
+    assert LiveQuery(limit=10).where() is None
+
+def test_matches():
+    q = LiveQuery(limit=10, zone_number="7001", bbox=CBD, status="PRESENT")
+    assert q.matches(rec("1", -37.81, 144.96))
+    assert q.matches(rec("1", -37.81, 144.96, status="present"))
+    assert not q.matches(rec("1", -37.81, 144.96, status="Unoccupied"))
+    assert not q.matches(rec("1", -37.81, 144.96, zone="7002"))
+    assert not q.matches(rec("1", -37.79, 144.96))   # north of the bbox
+    assert not q.matches({"Location": None})
+    assert LiveQuery(limit=10, bbox=CBD).matches({"Location": "-37.81, 144.96"})
+
+def test_covers_bbox_containment():
+    city = LiveQuery(limit=5000)
+    cbd = LiveQuery(limit=5000, bbox=CBD)
+    inner = LiveQuery(limit=5000, bbox=INSIDE)
+    assert city.covers(cbd) and city.covers(inner)
+    assert cbd.covers(inner)
+    assert not inner.covers(cbd)
+    assert not cbd.covers(city)
+    # overlapping but not contained
+    shifted = LiveQuery(limit=5000, bbox=(144.97, -37.815, 144.99, -37.805))
+    assert not cbd.covers(shifted)
+
+def test_covers_zone_and_status():
+    any_status = LiveQuery(limit=5000, zone_number="7001")
+    free = LiveQuery(limit=5000, zone_number="7001", status="unoccupied")
+    assert any_status.covers(free)
+    assert not free.covers(any_status)
+    assert free.covers(LiveQuery(limit=5000, zone_number="7001", status="Unoccupied"))
+    assert not free.covers(LiveQuery(limit=5000, zone_number="7001", status="Present"))
+    assert not any_status.covers(LiveQuery(limit=5000, zone_number="7002"))
+    assert not any_status.covers(LiveQuery(limit=5000))
+
+def test_lookup_filters_complete_superset():
+    cache = SnapshotCache(ttl_seconds=60)
+    rows = [rec("1", -37.81, 144.96, "Unoccupied"), rec("2", -37.81, 144.96, "Present"),
+            rec("3", -37.79, 144.96, "Unoccupied")]
+    cache.store(LiveQuery(limit=5000), rows, complete=True)
+    got = cache.lookup(LiveQuery(limit=100, bbox=CBD, status="unoccupied"))
+    assert [r["KerbsideID"] for r in got] == ["1"]
+    # limit applies to the filtered rows
+    assert len(cache.lookup(LiveQuery(limit=1, status="Unoccupied"))) == 1
+
+def test_lookup_truncated_only_answers_itself():
+    cache = SnapshotCache(ttl_seconds=60)
+    city = LiveQuery(limit=2)
+    rows = [rec("1", -37.81, 144.96), rec("2", -37.81, 144.96)]
+    cache.store(city, rows, complete=False)
+    assert cache.lookup(city) is rows
+    assert cache.lookup(LiveQuery(limit=2, bbox=CBD)) is None
+
+def test_lookup_expires():
+    cache = SnapshotCache(ttl_seconds=0)
+    cache.store(LiveQuery(limit=10), [], complete=True)
+    assert cache.lookup(LiveQuery(limit=10)) is None
+
+def test_store_replaces_same_query_and_caps_entries():
+    cache = SnapshotCache(ttl_seconds=60, max_entries=2)
+    q = LiveQuery(limit=10, zone_number="7001")
+    cache.store(q, [rec("1", -37.81, 144.96)], complete=True)
+    cache.store(q, [], complete=True)
+    assert cache.lookup(q) == []
+    cache.store(LiveQuery(limit=10, zone_number="7002"), [], complete=True)
+    cache.store(LiveQuery(limit=10, zone_number="7003"), [], complete=True)
+    assert cache.lookup(q) is None
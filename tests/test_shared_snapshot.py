@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timezone
+
+from shared_snapshot import SharedSnapshot
+
+FLOOR = datetime(2025, 1, 22, 10, 0, tzinfo=timezone.utc)
+
+def recs():
+    return [
+        {"id": 10001, "status": "present", "lastupdated": "2025-01-22T10:05:00+00:00", "lat": -37.81, "lon": 144.96},
+        {"id": None, "status": "unoccupied", "lastupdated": "2025-01-22T10:06:00.123456Z", "lat": -37.80, "lon": 144.97},
+        {"id": 10003, "status": "unoccupied", "lastupdated": "2025-01-22T09:59:00+00:00", "lat": -37.81, "lon": 144.96},
+    ]
+
+def publish(tmp_path, records, **kw):
+    shared = SharedSnapshot(str(tmp_path / "snap"))
+    snap = {"floor": FLOOR, "fetched_at": time.time(), "truncated": False,
+            "records": records, "rate": {"remaining": "42"}}
+    snap.update(kw)
+    shared.publish(snap)
+    return shared
+
+def test_round_trip(tmp_path):
+    shared = publish(tmp_path, recs())
+    snap = shared.read()
+    assert snap["generation"] == 1
+    assert snap["floor"] == FLOOR
+    assert snap["truncated"] is False
+    assert snap["rate"] == {"remaining": "42"}
+    view = snap["view"]
+    assert len(view) == 3
+    assert [view.row(i) for i in range(3)] == recs()
+
+def test_select(tmp_path):
+    view = publish(tmp_path, recs()).read()["view"]
+    floor_ts = FLOOR.timestamp()
+    assert [r["id"] for r in view.select(floor_ts)] == [10001, None]
+    assert [r["id"] for r in view.select(floor_ts, "unoccupied")] == [None]
+    assert view.select(floor_ts, "gone") == []
+    # s, w, n, e
+    assert [r["id"] for r in view.select(floor_ts, bbox=(-37.815, 144.955, -37.805, 144.965))] == [10001]
+    assert len(view.select(0.0)) == 3
+
+def test_read_follows_new_generation(tmp_path):
+    shared = publish(tmp_path, recs())
+    first = shared.read()
+    assert shared.read() is first
+    shared.publish({"floor": FLOOR, "fetched_at": time.time(), "truncated": True, "records": [], "rate": {}})
+    second = shared.read()
+    assert second["generation"] == 2 and second["truncated"] and len(second["view"]) == 0
+    # the previous generation's mapping is still readable by requests holding it
+    assert first["view"].row(0)["id"] == 10001
+
+def test_missing_file(tmp_path):
+    assert SharedSnapshot(str(tmp_path / "nothing")).read() is None
@@ -1,9 +1,16 @@
 # build_bay_availability_model.py
+import os
+import sys
+from pathlib import Path
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared parking_common package
+from parking_common.history_store import history_path, read_history
+
 SRC = "data/on-street-parking-bay-sensors.csv"
 OUT = "bay_availability_model.csv"
 OUT_ZONE = "parking_availability_model.csv"  # simple zone fallback from the same data
+HISTORY_DB = history_path()  # None when BAY_HISTORY_DB=0
 
 def to_slot_30(ts: pd.Timestamp) -> int:
     return ts.hour * 2 + (1 if ts.minute >= 30 else 0)
@@ -11,23 +18,41 @@ def to_slot_30(ts: pd.Timestamp) -> int:
 def clean_status(s):
     return (str(s).strip().lower() if pd.notna(s) else "")
 
+keep = ["KerbsideID", "Status_Description", "Status_Timestamp", "Zone_Number"]
+
 print("Loading…")
-df = pd.read_csv(
-    SRC,
-    dtype={"KerbsideID": "Int64", "Zone_Number": "Int64"},
-)
+frames = []
+if os.path.exists(SRC):
+    csv = pd.read_csv(
+        SRC,
+        dtype={"KerbsideID": "Int64", "Zone_Number": "Int64"},
+    )
+    # Expect these columns: KerbsideID, Status_Description, Status_Timestamp, Zone_Number
+    missing = [c for c in keep if c not in csv.columns]
+    if missing:
+        raise ValueError(f"Missing columns in {SRC}: {missing}")
+    csv = csv[keep].copy()
+    csv["ts"] = pd.to_datetime(csv["Status_Timestamp"], errors="coerce", utc=True)
+    frames.append(csv)
+    print(f"  {SRC}: {len(csv):,} rows")
 
-# Expect these columns: KerbsideID, Status_Description, Status_Timestamp, Zone_Number
-keep = ["KerbsideID", "Status_Description", "Status_Timestamp", "Zone_Number"]
-missing = [c for c in keep if c not in df.columns]
-if missing:
-    raise ValueError(f"Missing columns in {SRC}: {missing}")
+# Live snapshots recorded by the APIs (history_store.py)
+hist = read_history(HISTORY_DB)
+if not hist.empty:
+    hist["ts"] = hist["Status_Timestamp"]
+    hist = hist.astype({"KerbsideID": "Int64", "Zone_Number": "Int64"})
+    frames.append(hist[keep + ["ts"]])
+if HISTORY_DB:
+    print(f"  {HISTORY_DB}: {len(hist):,} rows")
 
-df = df[keep].copy()
+if not frames:
+    raise FileNotFoundError(f"No input: neither {SRC} nor {HISTORY_DB or 'a history store'} exists")
 
-df["ts"] = pd.to_datetime(df["Status_Timestamp"], errors="coerce", utc=True)\
-             .dt.tz_convert("Australia/Melbourne")
+df = pd.concat(frames, ignore_index=True)
+df["ts"] = df["ts"].dt.tz_convert("Australia/Melbourne")
 df = df.dropna(subset=["KerbsideID", "ts"])
+# the CSV dump and the history store overlap; keep one row per state change
+df = df.drop_duplicates(subset=["KerbsideID", "ts"], keep="last")
 
 df["status"]  = df["Status_Description"].map(clean_status)
 df["free"]    = (df["status"] == "unoccupied").astype(int)
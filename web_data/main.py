@@ -1,16 +1,43 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-import json
+import gzip
+import os
+import threading
+import time
+import orjson
+from contextlib import asynccontextmanager
 from datetime import datetime
 from zoneinfo import ZoneInfo
-import time
 import requests
-from typing import Optional, Dict, Any, List
+import sys
+from typing import Optional, Dict, Any, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared parking_common package
+from parking_common.history_store import open_history
+from parking_common.responses import ORJSONResponse
+from query_planner import LiveQuery, SnapshotCache, parse_bbox
+from parking_common.metrics import (
+    cache_result, install as install_metrics, observe_upstream_page, record_stage, stage,
+)
+
+try:
+    import brotli  # optional: enables Content-Encoding: br for the forecast index
+except ImportError:
+    brotli = None
 
-app = FastAPI(title="Melbourne Parking Forecasts", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # encode + gzip/brotli the forecast index before taking traffic, not inside
+    # the first /bays/forecasts/all request (that takes seconds on the full index)
+    if COMBINED.exists():
+        encoded_index()
+    yield
+
+app = FastAPI(title="Melbourne Parking Forecasts", version="0.1.0",
+              default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +45,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+install_metrics(app)
 
 TZ = ZoneInfo("Australia/Melbourne")
 
@@ -31,53 +59,93 @@ app.mount("/web_data", StaticFiles(directory=str(BASE / "web_data")), name="web_
 _bay_idx = None
 def load_index():
     global _bay_idx
+    cache_result("forecast_index", _bay_idx is not None)
     if _bay_idx is None:
         if not COMBINED.exists():
             raise FileNotFoundError("Run export_forecasts.py first to create web_data/")
-        with COMBINED.open() as f:
-            combined = json.load(f)
+        combined = orjson.loads(COMBINED.read_bytes())
         _bay_idx = combined["bays"]  # dict[str -> list[points]]
     return _bay_idx
 
+# /bays/forecasts/all never changes while the process runs, so encode and
+# compress it once; each request is then just a bytes copy.
+_index_bytes: Dict[str, bytes] = {}
+_index_bytes_lock = threading.Lock()
+
+def encoded_index() -> Dict[str, bytes]:
+    if not _index_bytes:
+        with _index_bytes_lock:
+            if not _index_bytes:
+                body = orjson.dumps(load_index())
+                enc = {"identity": body, "gzip": gzip.compress(body, 9)}
+                if brotli is not None:
+                    enc["br"] = brotli.compress(body, quality=11)
+                _index_bytes.update(enc)
+    return _index_bytes
+
+def pick_encoding(accept_encoding: str, available) -> str:
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name)
+    for enc in ("br", "gzip"):
+        if enc in available and (enc in accepted or "*" in accepted):
+            return enc
+    return "identity"
+
 
 # --- LIVE DATA (City of Melbourne) ---
-LIVE_API_URL = (
+LIVE_API_URL = os.getenv(
+    "MELB_API_URL",
     "https://data.melbourne.vic.gov.au/api/explore/v2.1/catalog/datasets/"
-    "on-street-parking-bay-sensors/records"
+    "on-street-parking-bay-sensors/records",
 )
 
-# Small in-memory cache keyed by params
-_live_cache: Dict[str, Any] = {"key": None, "data": None, "fetched_at": 0.0}
 LIVE_TTL_SECONDS = 30  # serve cached live data for this long
+LIVE_FETCH_CAP = 5000
+
+# Recent results keyed by query; a fresh city-wide result also answers smaller
+# bbox/zone/status queries without another upstream crawl.
+_live_cache = SnapshotCache(ttl_seconds=LIVE_TTL_SECONDS)
 
-def _live_cache_key(limit: int, zone_number: Optional[str], bbox: Optional[str]) -> str:
-    return f"{int(limit)}|{zone_number or ''}|{bbox or ''}"
-
-def _get_live_cached(limit=1000, zone_number: Optional[str] = None, bbox: Optional[str] = None):
-    now = time.time()
-    key = _live_cache_key(limit, zone_number, bbox)
-    if (
-        _live_cache.get("key") == key and
-        (now - _live_cache.get("fetched_at", 0.0)) < LIVE_TTL_SECONDS and
-        _live_cache.get("data") is not None
-    ):
-        return _live_cache["data"]
-
-    data = _fetch_live_bays(limit=limit, zone_number=zone_number, bbox=bbox)
-    _live_cache.update({"key": key, "data": data, "fetched_at": now})
-    return data
-
-def _fetch_live_bays(limit: int = 1000, zone_number: Optional[str] = None,
-                     bbox: Optional[str] = None) -> List[Dict[str, Any]]:
+# Every live fetch is appended (state changes only) to the history store so
+# build_bay_availability_model.py can learn from it. BAY_HISTORY_DB sets its path
+# (default data/bay_history.sqlite, shared with parking-backend); BAY_HISTORY_DB=0 disables.
+HISTORY = open_history()
+
+def _get_live_cached(limit=1000, zone_number: Optional[str] = None, bbox: Optional[str] = None,
+                     status: Optional[str] = None):
+    q = LiveQuery(
+        limit=max(1, min(int(limit or 100), LIVE_FETCH_CAP)),
+        zone_number=(zone_number or "").strip() or None,
+        bbox=parse_bbox(bbox),
+        status=status,
+    )
+    with stage("snapshot_lookup"):
+        rows = _live_cache.lookup(q)
+    cache_result("live", rows is not None)
+    if rows is not None:
+        return rows
+
+    rows, complete = _fetch_live_bays(q)
+    _live_cache.store(q, rows, complete)
+    return rows
+
+def _fetch_live_bays(q: LiveQuery) -> Tuple[List[Dict[str, Any]], bool]:
     """
     Pull live bay records from the open data API with paging.
     Socrata v2.1 commonly rejects very large single-page limits (400 errors),
-    so we request pages of 100 and aggregate until we reach `limit` (capped at 5000).
+    so we request pages of 100 and aggregate until we reach `q.limit` (capped at 5000).
+    Filters are pushed into the ODSQL `where`. Returns (rows, complete), where
+    complete means upstream ran out of rows before the limit.
     """
     # total desired rows (across pages)
-    total_needed = max(1, min(int(limit or 100), 5000))
+    total_needed = q.limit
     per_page = 100  # safe per-page size for v2.1
     offset = 0
+    complete = False
 
     base_params = {
         "limit": per_page,
@@ -86,20 +154,21 @@ def _fetch_live_bays(limit: int = 1000, zone_number: Optional[str] = None,
         # Optional: order for deterministic paging (field must exist)
         "order_by": "kerbsideid",
     }
-
-    # Add a simple server-side filter if given
-    where_clauses = []
-    if zone_number:
-        where_clauses.append(f"zone_number = '{zone_number}'")
-    if where_clauses:
-        base_params["where"] = " AND ".join(where_clauses)
+    where = q.where()
+    if where:
+        base_params["where"] = where
 
     out: List[Dict[str, Any]] = []
+    raw: List[Dict[str, Any]] = []
+    # accumulated across pages and observed once per fetch, like the proxy's stages;
+    # upstream_fetch covers the HTTP paging only, not normalize or the history write
+    http_seconds = normalize_seconds = 0.0
 
     try:
         while len(out) < total_needed:
             params = dict(base_params)
             params["offset"] = offset
+            t0 = time.perf_counter()
             r = requests.get(LIVE_API_URL, params=params, timeout=15, headers={"Accept": "application/json"})
             try:
                 r.raise_for_status()
@@ -111,11 +180,16 @@ def _fetch_live_bays(limit: int = 1000, zone_number: Optional[str] = None,
                 )
 
             payload = r.json()
+            http_seconds += time.perf_counter() - t0
             rows = payload.get("results", [])
+            observe_upstream_page(r.headers, len(rows))
             if not rows:
+                complete = True
                 break
+            raw.extend(rows)
 
             # normalize fields
+            t0 = time.perf_counter()
             for row in rows:
                 out.append({
                     "KerbsideID": str(row.get("kerbsideid") or ""),
@@ -126,53 +200,42 @@ def _fetch_live_bays(limit: int = 1000, zone_number: Optional[str] = None,
                 })
                 if len(out) >= total_needed:
                     break
+            normalize_seconds += time.perf_counter() - t0
 
             # stop if fewer than a full page returned
             if len(rows) < per_page:
+                complete = len(out) < total_needed
                 break
 
             offset += per_page
     except Exception as e:
         # any other failure -> 502
         raise HTTPException(status_code=502, detail=f"Live API request failed: {e}")
+    finally:
+        record_stage("upstream_fetch", http_seconds)
+        record_stage("normalize", normalize_seconds)
+
+    if HISTORY is not None:
+        HISTORY.record_best_effort(raw)
 
-    # Optional client-side bbox filter (string: "minLon,minLat,maxLon,maxLat")
-    if bbox:
-        try:
-            min_lon, min_lat, max_lon, max_lat = [float(x) for x in bbox.split(",")]
-            def in_bbox(rec: Dict[str, Any]) -> bool:
-                loc = rec.get("Location")
-                if not loc:
-                    return False
-                if isinstance(loc, str) and "," in loc:
-                    # "lat,lon" format
-                    lat_str, lon_str = [t.strip() for t in loc.split(",")]
-                    lat, lon = float(lat_str), float(lon_str)
-                elif isinstance(loc, dict):
-                    lat, lon = float(loc.get("lat")), float(loc.get("lon"))
-                else:
-                    return False
-                return (min_lat <= lat <= max_lat) and (min_lon <= lon <= max_lon)
-            out = [r for r in out if in_bbox(r)]
-        except Exception:
-            # ignore bbox errors
-            pass
-
-    return out
+    return out, complete
 
 @app.get("/bays/live")
-def bays_live(limit: int = 1000, zone_number: Optional[str] = None, bbox: Optional[str] = None):
+def bays_live(limit: int = 1000, zone_number: Optional[str] = None, bbox: Optional[str] = None,
+              status: Optional[str] = None):
     """
     Current live bay statuses from the City of Melbourne API (cached ~30s).
-    Optional: limit, zone_number, bbox (string: "minLon,minLat,maxLon,maxLat"; client-side filter).
+    Optional: limit, zone_number, bbox (string: "minLon,minLat,maxLon,maxLat"),
+    status (e.g. "Unoccupied"); all filters are applied upstream.
     """
-    rows = _get_live_cached(limit=limit, zone_number=zone_number, bbox=bbox)
-    return {
-        "fetchedAt": datetime.now(TZ).isoformat(),
-        "ttlSeconds": LIVE_TTL_SECONDS,
-        "count": len(rows),
-        "rows": rows
-    }
+    rows = _get_live_cached(limit=limit, zone_number=zone_number, bbox=bbox, status=status)
+    with stage("serialize"):
+        return ORJSONResponse({
+            "fetchedAt": datetime.now(TZ).isoformat(),
+            "ttlSeconds": LIVE_TTL_SECONDS,
+            "count": len(rows),
+            "rows": rows
+        })
 
 @app.get("/bays/with_forecast")
 def bay_with_forecast(kerbside_id: str):
@@ -180,8 +243,9 @@ def bay_with_forecast(kerbside_id: str):
     For a bay: return live status (if available) + forecast points (from bay_forecasts.json).
     """
     # Forecast
-    idx = load_index()
-    points = idx.get(str(kerbside_id))
+    with stage("forecast_lookup"):
+        idx = load_index()
+        points = idx.get(str(kerbside_id))
     if not points:
         raise HTTPException(status_code=404, detail="kerbside_id not found in forecasts")
 
@@ -198,12 +262,13 @@ def bay_with_forecast(kerbside_id: str):
         elif s == "present":
             now_prob = 0.0
 
-    return {
-        "kerbsideId": kerbside_id,
-        "live": live,
-        "nowProb": now_prob,
-        "points": points  # keep the same field name as /bays/forecasts to simplify frontend reuse
-    }
+    with stage("serialize"):
+        return ORJSONResponse({
+            "kerbsideId": kerbside_id,
+            "live": live,
+            "nowProb": now_prob,
+            "points": points  # keep the same field name as /bays/forecasts to simplify frontend reuse
+        })
 
 @app.get("/health")
 def health():
@@ -211,8 +276,9 @@ def health():
 
 @app.get("/bays/forecasts")
 def bay_forecasts(kerbside_id: str):
-    idx = load_index()
-    points = idx.get(str(kerbside_id))
+    with stage("forecast_lookup"):
+        idx = load_index()
+        points = idx.get(str(kerbside_id))
     if not points:
         raise HTTPException(status_code=404, detail="kerbside_id not found")
     return {
@@ -221,5 +287,13 @@ def bay_forecasts(kerbside_id: str):
     }
 
 @app.get("/bays/forecasts/all")
-def all_bays():
-    return load_index()
+def all_bays(request: Request):
+    with stage("forecast_lookup"):
+        load_index()  # cached dict; keeps the forecast_index hit counter honest for this route
+    with stage("serialize"):
+        encoded = encoded_index()
+    enc = pick_encoding(request.headers.get("accept-encoding", ""), encoded)
+    headers = {"Vary": "Accept-Encoding"}
+    if enc != "identity":
+        headers["Content-Encoding"] = enc
+    return Response(encoded[enc], media_type="application/json", headers=headers)
@@ -0,0 +1,126 @@
+# query_planner.py
+"""
+Plans live-bay queries against the open data API.
+
+Filters (zone_number, bbox, status) are pushed down into the ODSQL `where`
+clause so upstream pages and bytes scale with the viewport instead of the city.
+Before going upstream, `SnapshotCache.lookup()` checks whether a fresh cached
+result is a superset of the query (e.g. a city-wide fetch answering a small
+bbox) and, if so, answers it by filtering that snapshot locally.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from parking_common.status import canonical_status
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+def parse_bbox(bbox: Optional[str]) -> Optional[BBox]:
+    """"minLon,minLat,maxLon,maxLat" -> tuple; malformed input means no bbox filter."""
+    if not bbox:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(x) for x in bbox.split(",")]
+    except ValueError:
+        return None
+    return (min_lon, min_lat, max_lon, max_lat)
+
+def _quote(v: str) -> str:
+    return "'" + str(v).replace("'", "''") + "'"
+
+def record_lat_lon(rec: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    loc = rec.get("Location")
+    try:
+        if isinstance(loc, str) and "," in loc:
+            # "lat,lon" format
+            lat_str, lon_str = [t.strip() for t in loc.split(",")]
+            return float(lat_str), float(lon_str)
+        if isinstance(loc, dict):
+            return float(loc.get("lat")), float(loc.get("lon"))
+    except (TypeError, ValueError):
+        pass
+    return None
+
+@dataclass(frozen=True)
+class LiveQuery:
+    limit: int
+    zone_number: Optional[str] = None
+    bbox: Optional[BBox] = None
+    status: Optional[str] = None
+
+    def __post_init__(self):
+        # upstream compares status case-sensitively; local matching does not
+        object.__setattr__(self, "status", canonical_status(self.status))
+
+    def where(self) -> Optional[str]:
+        clauses = []
+        if self.zone_number:
+            clauses.append(f"zone_number = {_quote(self.zone_number)}")
+        if self.status:
+            clauses.append(f"status_description = {_quote(self.status)}")
+        if self.bbox:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            # ODSQL: in_bbox(geo_field, lat1, lon1, lat2, lon2)
+            clauses.append(f"in_bbox(location, {min_lat}, {min_lon}, {max_lat}, {max_lon})")
+        return " AND ".join(clauses) or None
+
+    def matches(self, rec: Dict[str, Any]) -> bool:
+        if self.zone_number and rec.get("Zone_Number") != str(self.zone_number).strip():
+            return False
+        if self.status and (rec.get("Status_Description") or "").lower() != self.status.lower():
+            return False
+        if self.bbox:
+            ll = record_lat_lon(rec)
+            if ll is None:
+                return False
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            lat, lon = ll
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                return False
+        return True
+
+    def covers(self, other: "LiveQuery") -> bool:
+        """True if every row `other` can return is also selected by this query's filters."""
+        if self.zone_number and self.zone_number != other.zone_number:
+            return False
+        if self.status and (other.status or "").lower() != self.status.lower():
+            return False
+        if self.bbox:
+            if not other.bbox:
+                return False
+            a, b = self.bbox, other.bbox
+            if not (a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]):
+                return False
+        return True
+
+class SnapshotCache:
+    """Recent query results; serves any query covered by a fresh, complete superset."""
+    def __init__(self, ttl_seconds: float, max_entries: int = 16):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def lookup(self, q: LiveQuery) -> Optional[List[Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            self._entries = [e for e in self._entries if now - e["fetched_at"] < self.ttl]
+            entries = list(self._entries)
+        for e in entries:
+            if e["query"] == q:
+                return e["rows"]
+        for e in entries:
+            # a truncated result is only a superset of itself
+            if e["complete"] and e["query"].covers(q):
+                return [r for r in e["rows"] if q.matches(r)][:q.limit]
+        return None
+
+    def store(self, q: LiveQuery, rows: List[Dict[str, Any]], complete: bool):
+        with self._lock:
+            self._entries = [e for e in self._entries if e["query"] != q]
+            self._entries.insert(0, {
+                "query": q, "rows": rows, "complete": complete, "fetched_at": time.time(),
+            })
+            del self._entries[self.max_entries:]